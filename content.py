@@ -10,14 +10,18 @@ links are automatically identified and downloaded.
 Setup and Usage:
 1. Install Required Python Packages:
    - requests
-   - beautifulsoup4
-   - pdfkit
+   - selectolax
+   - Optional: requests-cache, to keep a local HTTP cache of API responses so
+     unchanged course metadata is revalidated instead of re-sent
 
 2. Install wkhtmltopdf:
-   - This tool is required by pdfkit to convert HTML content (pages, assignments,
+   - This tool is required to convert HTML content (pages, assignments,
      modules) into PDF files.
    - Download and install it from: https://wkhtmltopdf.org/downloads.html
    - Default path after installation will work.
+   - If wkhtmltopdf is not found, PDFs are rendered with WeasyPrint when it is
+     installed (`pip install weasyprint`); otherwise that content is saved as
+     `.html` files instead.
 
 3. Set Environment Variables:
    - Log into Canvas, go to Account > Settings > Approved Integrations, and
@@ -26,12 +30,15 @@ Setup and Usage:
    - Set CANVAS_DOMAIN environment variable with your Canvas domain
      (e.g., 'https://canvas.pitt.edu').
    - For GitHub Actions, add these as secrets in your repository settings.
+   - Optionally set MAX_DOWNLOAD_WORKERS (default 16) to change how many files,
+     pages, etc. are fetched concurrently.
 
 4. Run the Script:
    - python canvas_course_downloader.py
    - It will retrieve currently enrolled (active) Canvas courses only
    - Download all available files, linked content, and assignment submissions
-   - Convert Canvas-hosted HTML content into PDFs (no `.html` files are saved)
+   - Convert Canvas-hosted HTML content into PDFs (no `.html` files are saved
+     when wkhtmltopdf is available)
    - Save everything to a structured local folder organized by course
 
 Output:
@@ -57,31 +64,50 @@ Notes:
     writes assignment details in the Canvas page itself.
   - These files are still processed because they often contain embedded links
     to downloadable materials.
+- Pages and assignments with no visible text or images are not converted to
+  PDF at all; their linked files are still downloaded.
+- Downloaded files are recorded in `canvas_all_content/.manifest.json`. On later
+  runs, files whose Canvas `updated_at` is unchanged and whose local copy still
+  exists are skipped, and others are requested conditionally (ETag).
 """
 
 import os
+import json
+import functools
 import re
 import platform
 import shutil
+import subprocess
 import zipfile
 import tempfile
+import threading
+from collections import Counter
 import requests
-import pdfkit
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from selectolax.lexbor import LexborHTMLParser
+from urllib.parse import quote, urljoin, urlsplit
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import weasyprint  # Optional: renders PDFs in-process when wkhtmltopdf is missing
+except (ImportError, OSError):  # OSError: Pango/Cairo system libraries not found
+    weasyprint = None
+
+try:
+    import requests_cache  # Optional: revalidates API responses with ETags across runs
+except ImportError:
+    requests_cache = None
 
 
 # Configuration for wkhtmltopdf (platform-agnostic)
-# Try to find wkhtmltopdf automatically
+# Try to find wkhtmltopdf automatically. The binary is driven directly by
+# render_pdfs(), so only its path is needed here.
 wkhtmltopdf_path = shutil.which("wkhtmltopdf")
-if wkhtmltopdf_path:
-    pdfkit_config = pdfkit.configuration(wkhtmltopdf=wkhtmltopdf_path)
-else:
+if not wkhtmltopdf_path:
     # Fallback paths for different platforms
     if platform.system() == "Windows":
-        pdfkit_config = pdfkit.configuration(
-            wkhtmltopdf=r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe"
-        )
+        possible_paths = [r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe"]
     elif platform.system() == "Darwin":  # macOS
         # Common macOS installation paths
         possible_paths = [
@@ -89,16 +115,39 @@ else:
             "/opt/homebrew/bin/wkhtmltopdf",
             "/usr/bin/wkhtmltopdf",
         ]
-        for path in possible_paths:
-            if os.path.exists(path):
-                pdfkit_config = pdfkit.configuration(wkhtmltopdf=path)
-                break
-        else:
-            # If not found, let pdfkit try to find it automatically
-            pdfkit_config = pdfkit.configuration()
     else:
-        # Linux or other Unix-like systems
-        pdfkit_config = pdfkit.configuration()
+        # Linux or other Unix-like systems (shutil.which already searched PATH)
+        possible_paths = []
+    wkhtmltopdf_path = next(
+        (path for path in possible_paths if os.path.exists(path)), None
+    )
+
+# Checked once here rather than letting every conversion fail to launch; without
+# wkhtmltopdf, PDFs are rendered with WeasyPrint if it's installed, and HTML
+# content is saved as .html files otherwise.
+HAS_WKHTMLTOPDF = wkhtmltopdf_path is not None
+if not HAS_WKHTMLTOPDF:
+    if weasyprint is not None:
+        print("⚠️  wkhtmltopdf not found. Rendering PDFs with WeasyPrint instead.")
+    else:
+        print("⚠️  wkhtmltopdf not found. Pages and assignments will be saved as HTML.")
+
+
+# Global wkhtmltopdf options. Canvas page bodies are static HTML, so JavaScript and
+# smart shrinking (the most expensive layout passes) can be skipped. Broken
+# resources (e.g. images behind Canvas session auth) shouldn't fail a whole page.
+WKHTMLTOPDF_OPTIONS = [
+    "--quiet",
+    "--encoding",
+    "utf-8",
+    "--disable-javascript",
+    "--disable-smart-shrinking",
+    "--load-error-handling",
+    "ignore",
+]
+
+# Number of wkhtmltopdf processes rendering PDFs side by side
+PDF_RENDER_PROCESSES = os.cpu_count() or 1
 
 
 # Get Canvas API token and domain from environment variables
@@ -128,6 +177,56 @@ def ensure_canvas_creds():
 BASE_API_URL = f"{CANVAS_DOMAIN}/api/v1"
 HEADERS = {"Authorization": f"Bearer {CANVAS_API_TOKEN}"}
 
+# Number of items (files, pages, assignments, ...) fetched concurrently. Each item
+# task runs its own follow-up requests inline, so the pool never waits on itself.
+# Override with the MAX_DOWNLOAD_WORKERS environment variable.
+try:
+    MAX_DOWNLOAD_WORKERS = max(1, int(os.getenv("MAX_DOWNLOAD_WORKERS") or 16))
+except ValueError:
+    print(
+        f"⚠️  Ignoring invalid MAX_DOWNLOAD_WORKERS={os.getenv('MAX_DOWNLOAD_WORKERS')!r}; using 16."
+    )
+    MAX_DOWNLOAD_WORKERS = 16
+
+# Shared HTTP session: nearly every request goes to CANVAS_DOMAIN, so reuse keep-alive
+# connections instead of paying a TCP+TLS handshake per call. Transient errors and
+# rate limiting (429) are retried with backoff.
+if requests_cache is not None:
+    # API JSON (course, page, assignment, module and file metadata) is kept in a
+    # local cache and revalidated with If-None-Match, so unchanged responses come
+    # back as small 304s. File bodies are never cached; fetch_canvas_file handles
+    # those with the download manifest.
+    SESSION = requests_cache.CachedSession(
+        os.path.join(os.path.expanduser("~"), ".cache", "canvas_content_http"),
+        backend="sqlite",
+        expire_after=3600,
+        cache_control=True,
+        urls_expire_after={
+            f"{urlsplit(CANVAS_DOMAIN).netloc}/api/v1": 3600,
+            "*": requests_cache.DO_NOT_CACHE,
+        },
+    )
+else:
+    SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    # Room for every download worker plus the per-course stage threads
+    pool_maxsize=MAX_DOWNLOAD_WORKERS + 16,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        # Hand the final response back once retries run out, so callers' own
+        # status checks (403/404 skips, .ok) still apply instead of a RetryError
+        raise_on_status=False,
+    ),
+)
+# Mounted for both schemes so plain-http links (e.g. a CANVAS_DOMAIN configured
+# without TLS) get the same pooling and retries
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
 # Determine where to save files - use repo directory if in GitHub Actions, otherwise Downloads
 if os.getenv("GITHUB_WORKSPACE"):
     # Running in GitHub Actions - save to repo
@@ -147,34 +246,232 @@ COURSES_TO_SKIP = [
     "Stay TA Ready",
 ]
 
+DOWNLOAD_POOL = ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS)
+# Separate pool for fetching listing pages: safe_paginate() is also called from
+# DOWNLOAD_POOL tasks, which must not wait on their own pool
+PAGINATION_POOL = ThreadPoolExecutor(max_workers=8)
+
+# Downloads are streamed to disk in chunks of this size; zip archives are buffered
+# in memory up to ZIP_SPOOL_MAX_SIZE before spilling to a temporary file
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+ZIP_SPOOL_MAX_SIZE = 16 << 20
+
+# Canvas file references look like .../files/<id>; compiled once for the hot loops
+_FILE_ID_RE = re.compile(r"/files/(\d+)")
+_SAFE_NAME_RE = re.compile(r'[<>:"/\\|?*]')
+_PAGE_PARAM_RE = re.compile(r"([?&]page=)(\d+)")
+
+# Canvas file IDs already requested; checked before any HTTP call is made. Every
+# course file is deduped by ID, which (unlike its signed download URL) is stable
+downloaded_file_ids = set()
+# Submission attachment URLs already downloaded
 downloaded_file_urls = set()
+# Downloads run on worker threads, so the dedupe check-and-add must be atomic
+_downloaded_lock = threading.Lock()
+
+# Canvas file objects from the course Files listings, keyed by file ID (str). Filled
+# by main() before a course's stages start, so worker threads only read it. These
+# files are downloaded by the files stage alone.
+course_files = {}
+# Saved file names that more than one listed file maps to; a local file with such
+# a name can't be attributed to a Canvas file by its size alone
+shared_filenames = set()
+
+# File names in each course folder, listed with one scandir per folder and kept
+# up to date as files are written, so existence checks don't stat() each path
+folder_names = {}
+# Destination paths claimed during this run. Downloads run concurrently and
+# Canvas files in different folders often share a name, so two tasks must never
+# stream into the same path; guarded by _folder_names_lock as well.
+claimed_paths = set()
+# Lock order: _folder_names_lock may be held while taking _manifest_lock, never
+# the other way round
+_folder_names_lock = threading.Lock()
+
+# Per-file download state from previous runs ({file_id: {"updated_at", "etag",
+# "last_modified", "size", "paths"}}), used to skip files that haven't changed
+MANIFEST_PATH = os.path.join(DOWNLOADS_BASE, ".manifest.json")
+manifest = {}
+# Which file ID each recorded path belongs to ({absolute path: file_id}), so one
+# Canvas file is never written over another's local copy
+manifest_owners = {}
+_manifest_lock = threading.Lock()
+
+# HTML documents waiting to be converted, keyed by destination folder
+pending_pdfs = {}
+_pending_pdfs_lock = threading.Lock()
+
+
+def claim_download(url):
+    """Mark a URL as downloaded; return False if it was already claimed."""
+    with _downloaded_lock:
+        if url in downloaded_file_urls:
+            return False
+        downloaded_file_urls.add(url)
+        return True
+
+
+def claim_file_id(file_id):
+    """Mark a Canvas file ID as seen; return False if it was already claimed."""
+    file_id = str(file_id)  # IDs arrive as ints (API) or strings (regex matches)
+    with _downloaded_lock:
+        if file_id in downloaded_file_ids:
+            return False
+        downloaded_file_ids.add(file_id)
+        return True
+
+
+def _listed_names(folder):
+    """Return the cached set of names in folder; caller holds _folder_names_lock."""
+    names = folder_names.get(folder)
+    if names is None:
+        try:
+            names = {entry.name for entry in os.scandir(folder)}
+        except FileNotFoundError:
+            names = set()
+        folder_names[folder] = names
+    return names
+
+
+def file_exists(path):
+    """Check whether a file exists using the cached folder listing."""
+    folder, name = os.path.split(path)
+    with _folder_names_lock:
+        return name in _listed_names(folder)
+
+
+def record_written(path):
+    """Add a newly written file to the cached folder listing."""
+    folder, name = os.path.split(path)
+    with _folder_names_lock:
+        _listed_names(folder).add(name)
+
+
+def _path_owner(path):
+    """Return the file ID the manifest records for path, or None."""
+    with _manifest_lock:
+        return manifest_owners.get(path)
+
+
+def _path_taken(path, file_id):
+    """Return True if path belongs to another download; caller holds _folder_names_lock.
+
+    A path is taken once it's claimed in this run, or if the manifest records
+    it for a different Canvas file.
+    """
+    if path in claimed_paths:
+        return True
+    owner = _path_owner(path)
+    return owner is not None and owner != file_id
+
+
+def claim_unique_name(folder, name, file_id=None):
+    """Reserve a name in folder, adding _1, _2, ... if it's already taken.
+
+    Existing files count as taken unless the manifest records them for file_id.
+    """
+    base, ext = os.path.splitext(name)
+    counter = 1
+    with _folder_names_lock:
+        used_names = _listed_names(folder)
+        path = os.path.join(folder, name)
+        while _path_taken(path, file_id) or (
+            name in used_names and _path_owner(path) != file_id
+        ):
+            name = f"{base}_{counter}{ext}"
+            path = os.path.join(folder, name)
+            counter += 1
+        used_names.add(name)
+        claimed_paths.add(path)
+    return name
+
+
+def claim_write_path(folder, name, file_id=None):
+    """Reserve a destination path for this run and return it.
+
+    Files left by earlier runs are overwritten, but if another download in this
+    run already claimed the path, or the manifest records it for another Canvas
+    file, _1, _2, ... is added to keep both files.
+    """
+    base, ext = os.path.splitext(name)
+    counter = 1
+    path = os.path.join(folder, name)
+    with _folder_names_lock:
+        while _path_taken(path, file_id):
+            name = f"{base}_{counter}{ext}"
+            path = os.path.join(folder, name)
+            counter += 1
+        claimed_paths.add(path)
+        # Listed right away so zip extraction doesn't pick the same name
+        _listed_names(folder).add(name)
+    return path
+
+
+def claim_paths(paths):
+    """Reserve the paths of a file kept from an earlier run for this run."""
+    with _folder_names_lock:
+        claimed_paths.update(paths)
+
+
+def claim_existing_path(path, file_id):
+    """Reserve an existing file for file_id unless another download owns it."""
+    with _folder_names_lock:
+        if _path_taken(path, file_id):
+            return False
+        claimed_paths.add(path)
+        return True
+
+
+def load_manifest():
+    """Load the download manifest written by the previous run, if any."""
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            manifest.update(json.load(f))
+    except FileNotFoundError:
+        return
+        pass
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Ignoring unreadable manifest {MANIFEST_PATH}: {e}")
+        return
+    with _manifest_lock:
+        for file_id, entry in manifest.items():
+            for path in entry.get("paths", []):
+                manifest_owners[os.path.join(DOWNLOADS_BASE, path)] = file_id
+
+
+def save_manifest():
+    """Write the download manifest so the next run can skip unchanged files."""
+    with _manifest_lock:
+        data = json.dumps(manifest, indent=2, sort_keys=True)
+    try:
+        with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+            f.write(data)
+    except OSError as e:
+        print(f"⚠️  Could not write manifest {MANIFEST_PATH}: {e}")
 
 
 def make_safe(name):
     """Sanitize filename by removing invalid characters."""
-    return re.sub(r'[<>:"/\\|?*]', "_", name).strip()
+    return _SAFE_NAME_RE.sub("_", name).strip()
 
 
-def extract_and_save_zip(zip_content, course_folder, zip_filename):
+def extract_and_save_zip(zip_file, course_folder, zip_filename, file_id=None):
     """Extract a zip file and save all its contents to the course folder.
 
     Args:
-        zip_content: The binary content of the zip file
+        zip_file: A seekable binary file object holding the zip archive
         course_folder: The destination folder for extracted files
         zip_filename: Original zip filename (for logging)
+        file_id: Canvas file ID of the archive; files it extracted on an earlier
+            run are overwritten rather than duplicated
 
     Returns:
         List of extracted file paths
     """
     extracted_files = []
     try:
-        # Create a temporary file to write the zip content
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as tmp_file:
-            tmp_file.write(zip_content)
-            tmp_path = tmp_file.name
-
         # Extract the zip file
-        with zipfile.ZipFile(tmp_path, "r") as zip_ref:
+        with zipfile.ZipFile(zip_file, "r") as zip_ref:
             for member in zip_ref.namelist():
                 # Skip directories and hidden/system files
                 if (
@@ -189,29 +486,22 @@ def extract_and_save_zip(zip_content, course_folder, zip_filename):
                 if not original_basename:
                     continue
 
-                safe_name = make_safe(original_basename)
+                # Handle duplicate filenames by adding a suffix; resolved against
+                # the cached folder listing rather than a stat() per candidate name
+                safe_name = claim_unique_name(
+                    course_folder, make_safe(original_basename), file_id
+                )
                 dest_path = os.path.join(course_folder, safe_name)
 
-                # Handle duplicate filenames by adding a suffix
-                base, ext = os.path.splitext(safe_name)
-                counter = 1
-                while os.path.exists(dest_path):
-                    safe_name = f"{base}_{counter}{ext}"
-                    dest_path = os.path.join(course_folder, safe_name)
-                    counter += 1
-
-                # Extract the file content and save it
+                # Stream the entry to disk rather than decompressing it into memory
                 try:
-                    file_content = zip_ref.read(member)
-                    with open(dest_path, "wb") as f:
-                        f.write(file_content)
+                    with zip_ref.open(member) as src, open(dest_path, "wb") as dst:
+                        shutil.copyfileobj(src, dst, DOWNLOAD_CHUNK_SIZE)
                     extracted_files.append(dest_path)
                     print(f"      📦 Extracted from zip: {safe_name}")
                 except Exception as e:
                     print(f"      ⚠️  Error extracting {member}: {e}")
 
-        # Clean up temporary file
-        os.unlink(tmp_path)
         print(f"    ✅ Extracted {len(extracted_files)} files from {zip_filename}")
 
     except zipfile.BadZipFile:
@@ -224,33 +514,222 @@ def extract_and_save_zip(zip_content, course_folder, zip_filename):
     return extracted_files
 
 
+def remaining_page_urls(response):
+    """Build the URLs of all pages after this one from its "next"/"last" links.
+
+    Returns an empty list when Canvas doesn't report numbered pages (some
+    endpoints use opaque bookmarks or omit the "last" link).
+    """
+    next_url = response.links.get("next", {}).get("url", "")
+    next_page = _PAGE_PARAM_RE.search(next_url)
+    last_page = _PAGE_PARAM_RE.search(response.links.get("last", {}).get("url", ""))
+    if not (next_page and last_page):
+        return []
+    return [
+        next_url[: next_page.start(2)] + str(page) + next_url[next_page.end(2) :]
+        for page in range(int(next_page.group(2)), int(last_page.group(2)) + 1)
+    ]
+
+
 def safe_paginate(url):
-    """Safely paginate through API results."""
+    """Safely paginate through API results.
+
+    When the page count is known, the remaining pages are fetched concurrently
+    instead of following one "next" link per round-trip.
+    """
     results = []
     try:
         while url:
-            r = requests.get(url, headers=HEADERS)
+            r = SESSION.get(url)
             if r.status_code in [403, 404]:
                 print(f"    Skipping ({r.status_code} error): {url}")
                 return []
             r.raise_for_status()
             results.extend(r.json())
             url = r.links.get("next", {}).get("url")
+
+            page_urls = remaining_page_urls(r)
+            if page_urls:
+                # map() keeps the pages in order
+                pages = PAGINATION_POOL.map(SESSION.get, page_urls)
+                for page_url, page in zip(page_urls, pages):
+                    if page.status_code in [403, 404]:
+                        print(f"    Skipping ({page.status_code} error): {page_url}")
+                        return []
+                    page.raise_for_status()
+                    results.extend(page.json())
+                break
         return results
     except Exception as e:
         print(f"    Error during pagination: {e}")
         return []
 
 
-def save_html_as_pdf(folder, name, html_content):
-    """Convert HTML content to PDF and save it."""
+# Documents with less visible text than this (and no images) are not worth a PDF
+MIN_PDF_TEXT_LENGTH = 20
+
+
+def is_blank_html(html_content):
+    """Return True if the HTML has (almost) no visible text and no images."""
+    # Parsed with the same C parser as the link extraction; the pure-Python
+    # html.parser was the slowest step for large page bodies
+    tree = LexborHTMLParser(html_content or "")
+    return (
+        len(tree.text(strip=True)) < MIN_PDF_TEXT_LENGTH
+        and tree.css_first("img") is None
+    )
+
+
+def save_html_as_pdf(folder, name, html_content, check_blank=True):
+    """Queue HTML content for conversion to PDF; see render_pdfs().
+
+    If neither wkhtmltopdf nor WeasyPrint is installed, the HTML is written to a
+    .html file instead. Pass check_blank=False if the caller already ran
+    is_blank_html on the content.
+    """
     safe_name = make_safe(name)
-    pdf_path = os.path.join(folder, f"{safe_name}.pdf")
+    if check_blank and is_blank_html(html_content):
+        print(f"    Skipped blank document: {safe_name}")
+        return
+    if not HAS_WKHTMLTOPDF and weasyprint is None:
+        html_path = os.path.join(folder, f"{safe_name}.html")
+        try:
+            with open(html_path, "w", encoding="utf-8") as f:
+                f.write(html_content)
+            print(f"    Saved HTML: {safe_name}.html")
+        except Exception as e:
+            print(f"    Error saving {safe_name}.html: {e}")
+        return
+    with _pending_pdfs_lock:
+        pending_pdfs.setdefault(folder, []).append((safe_name, html_content))
+
+
+def run_wkhtmltopdf(arg_lines):
+    """Run one wkhtmltopdf process over a batch of "input output" lines.
+
+    Returns the error output to report, or an empty string on success.
+    """
     try:
-        pdfkit.from_string(html_content, pdf_path, configuration=pdfkit_config)
-        print(f"    Saved PDF: {safe_name}.pdf")
+        result = subprocess.run(
+            [
+                wkhtmltopdf_path,
+                *WKHTMLTOPDF_OPTIONS,
+                "--read-args-from-stdin",
+            ],
+            input="\n".join(arg_lines) + "\n",
+            capture_output=True,
+            text=True,
+        )
     except Exception as e:
-        print(f"    Error converting {safe_name} to PDF: {e}")
+        return f"Error running wkhtmltopdf: {e}"
+    if result.returncode != 0:
+        return result.stderr.strip()
+    return ""
+
+
+def run_weasyprint(jobs, pdf_paths):
+    """Render (folder, safe_name, html) jobs in-process with WeasyPrint.
+
+    Each job is written to the matching entry of pdf_paths. Returns the error
+    messages to report.
+    """
+    errors = []
+    for (_, safe_name, html_content), pdf_path in zip(jobs, pdf_paths):
+        try:
+            # base_url resolves relative Canvas links and images
+            weasyprint.HTML(string=html_content, base_url=CANVAS_DOMAIN).write_pdf(
+                pdf_path
+            )
+        except Exception as e:
+            errors.append(f"{safe_name}: {e}")
+    return errors
+
+
+def render_pdfs():
+    """Convert all queued HTML to PDFs using one wkhtmltopdf process per CPU.
+
+    wkhtmltopdf's --read-args-from-stdin mode treats each stdin line as one
+    "input output" conversion, so the QtWebKit start-up cost is paid once per
+    process instead of once per document. Layout and rasterizing are CPU-bound,
+    so the documents are split across PDF_RENDER_PROCESSES processes; threads
+    are enough to drive them since they only wait on the subprocesses. A failing
+    document stops the rest of its batch, so anything missing afterwards is
+    retried in a process of its own.
+
+    Without wkhtmltopdf, the documents are rendered with WeasyPrint instead.
+    """
+    with _pending_pdfs_lock:
+        jobs = [
+            (folder, safe_name, html_content)
+            for folder, documents in pending_pdfs.items()
+            for safe_name, html_content in documents
+        ]
+        pending_pdfs.clear()
+    if not jobs:
+        return
+
+    # Render into a temporary directory and move each PDF into place only once
+    # it exists, so a failed conversion keeps the PDF from an earlier run
+    pdf_paths = [
+        os.path.join(folder, f"{safe_name}.pdf") for folder, safe_name, _ in jobs
+    ]
+    # The temporary directory sits under DOWNLOADS_BASE so os.replace stays on
+    # one file system
+    os.makedirs(DOWNLOADS_BASE, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix=".render-", dir=DOWNLOADS_BASE) as tmp_dir:
+        tmp_pdf_paths = [os.path.join(tmp_dir, f"{i}.pdf") for i in range(len(jobs))]
+        if not HAS_WKHTMLTOPDF:
+            errors = run_weasyprint(jobs, tmp_pdf_paths)
+        else:
+            arg_lines = []
+            for i, ((_, _, html_content), tmp_pdf_path) in enumerate(
+                zip(jobs, tmp_pdf_paths)
+            ):
+                html_path = os.path.join(tmp_dir, f"{i}.html")
+                with open(html_path, "w", encoding="utf-8") as f:
+                    f.write(html_content)
+                # Forward slashes keep Windows paths intact through wkhtmltopdf's
+                # backslash-escaping argument parser
+                arg_lines.append(
+                    f'"{html_path.replace(os.sep, "/")}" "{tmp_pdf_path.replace(os.sep, "/")}"'
+                )
+
+            processes = min(PDF_RENDER_PROCESSES, len(arg_lines))
+            batches = [arg_lines[i::processes] for i in range(processes)]
+            with ThreadPoolExecutor(max_workers=processes) as pool:
+                errors = [
+                    error for error in pool.map(run_wkhtmltopdf, batches) if error
+                ]
+
+                retry_lines = [
+                    [line]
+                    for line, tmp_pdf_path in zip(arg_lines, tmp_pdf_paths)
+                    if not os.path.exists(tmp_pdf_path)
+                ]
+                if retry_lines:
+                    # Batch errors are superseded by the per-document results
+                    errors = [
+                        error
+                        for error in pool.map(run_wkhtmltopdf, retry_lines)
+                        if error
+                    ]
+
+        for (folder, safe_name, _), tmp_pdf_path, pdf_path in zip(
+            jobs, tmp_pdf_paths, pdf_paths
+        ):
+            label = f"{os.path.basename(folder)}/{safe_name}"
+            if not os.path.exists(tmp_pdf_path):
+                print(f"    Error converting {label} to PDF")
+                continue
+            try:
+                os.replace(tmp_pdf_path, pdf_path)
+            except OSError as e:
+                print(f"    Error saving {label}.pdf: {e}")
+                continue
+            record_written(pdf_path)
+            print(f"    Saved PDF: {label}.pdf")
+    for error in errors:
+        print(f"    PDF renderer reported errors: {error}")
 
 
 def save_markdown(folder, name, markdown_content):
@@ -265,61 +744,375 @@ def save_markdown(folder, name, markdown_content):
         print(f"    Error saving {safe_name}.md: {e}")
 
 
-def save_or_unzip(content, folder, filename):
-    """Save content to file, or unzip if it's a zip file."""
+def save_or_unzip(response, folder, filename, file_id=None):
+    """Stream a response body to a file, or unzip it if it's a zip file.
+
+    file_id is the Canvas file being saved; see claim_write_path().
+
+    Returns:
+        List of file paths written to disk
+    """
     if filename.lower().endswith(".zip"):
         print(f"    📦 Detected ZIP file: {filename}, extracting...")
-        result = extract_and_save_zip(content, folder, filename)
-        if result is not None:
-            return  # Successfully extracted
-
-    # Not a zip or extraction failed - save as regular file
-    file_path = os.path.join(folder, filename)
+        # Small archives stay in memory; large ones spill to a temp file on disk
+        with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_SIZE) as buffer:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                buffer.write(chunk)
+            buffer.seek(0)
+            result = extract_and_save_zip(buffer, folder, filename, file_id)
+            if result is not None:
+                return result  # Successfully extracted
+
+            # Extraction failed - save the archive as a regular file
+            file_path = claim_write_path(folder, filename, file_id)
+            buffer.seek(0)
+            with open(file_path, "wb") as f:
+                shutil.copyfileobj(buffer, f, DOWNLOAD_CHUNK_SIZE)
+        record_written(file_path)
+        return [file_path]
+
+    # Not a zip - stream straight to disk without holding the body in memory
+    file_path = claim_write_path(folder, filename, file_id)
     with open(file_path, "wb") as f:
-        f.write(content)
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            f.write(chunk)
+    record_written(file_path)
+    return [file_path]
+
+
+def record_manifest(file_id, file_data, paths, etag=None, last_modified=None):
+    """Record a Canvas file's state and local paths in the download manifest."""
+    with _manifest_lock:
+        old_entry = manifest.get(file_id) or {}
+        for path in old_entry.get("paths", []):
+            path = os.path.join(DOWNLOADS_BASE, path)
+            if manifest_owners.get(path) == file_id:
+                del manifest_owners[path]
+        for path in paths:
+            manifest_owners[path] = file_id
+        manifest[file_id] = {
+            "updated_at": file_data.get("updated_at"),
+            "etag": etag,
+            "last_modified": last_modified,
+            "size": file_data.get("size"),
+            "paths": [os.path.relpath(path, DOWNLOADS_BASE) for path in paths],
+        }
+
+
+def fetch_canvas_file(file_data, course_folder, filename):
+    """Download a Canvas file object unless the local copy is already current.
+
+    Returns True if the file was downloaded, False if it was unchanged.
+    """
+    file_id = str(file_data["id"])
+    with _manifest_lock:
+        entry = manifest.get(file_id)
+    # Paths are stored relative to DOWNLOADS_BASE so the manifest survives a
+    # change of checkout location (e.g. a different Actions workspace)
+    recorded_paths = [
+        os.path.join(DOWNLOADS_BASE, path) for path in (entry or {}).get("paths", [])
+    ]
+    have_local_copy = bool(recorded_paths) and all(
+        file_exists(path) for path in recorded_paths
+    )
+    if have_local_copy and entry.get("updated_at") == file_data.get("updated_at"):
+        # Claimed so a same-named download later in this run can't overwrite it
+        claim_paths(recorded_paths)
+        return False
+
+    # Without a manifest record (first run, or the manifest was lost), trust a
+    # local copy whose size matches what Canvas reports, unless that copy is
+    # recorded for (or already claimed by) another Canvas file, or several listed
+    # files share its name
+    file_path = os.path.join(course_folder, filename)
+    if (
+        entry is None
+        and not filename.lower().endswith(".zip")
+        and filename not in shared_filenames
+        and file_data.get("size") is not None
+        and file_exists(file_path)
+        and os.path.getsize(file_path) == file_data["size"]
+        and claim_existing_path(file_path, file_id)
+    ):
+        record_manifest(file_id, file_data, [file_path])
+        return False
+
+    # An updated file is rewritten in place under the name it was saved with,
+    # rather than re-deriving one that may now belong to another file
+    if (
+        len(recorded_paths) == 1
+        and not filename.lower().endswith(".zip")
+        and os.path.dirname(recorded_paths[0]) == course_folder
+    ):
+        filename = os.path.basename(recorded_paths[0])
+
+    headers = {}
+    if have_local_copy:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    with SESSION.get(file_data["url"], headers=headers, stream=True) as r:
+        if r.status_code == 304:
+            claim_paths(recorded_paths)
+            with _manifest_lock:
+                entry["updated_at"] = file_data.get("updated_at")
+            return False
+        r.raise_for_status()
+        paths = save_or_unzip(r, course_folder, filename, file_id)
+        record_manifest(
+            file_id,
+            file_data,
+            paths,
+            etag=r.headers.get("ETag"),
+            last_modified=r.headers.get("Last-Modified"),
+        )
+    return True
 
 
 def download_canvas_file_by_id(file_id, course_folder):
     """Download a Canvas file by its file ID."""
+    # Files in the course listing belong to the files stage, so they are always
+    # saved under their listing filename whatever order the stages run in
+    if str(file_id) in course_files:
+        return
+    # The same file is often linked from several pages and modules; skip the
+    # metadata round-trip entirely for IDs that were already handled
+    if not claim_file_id(file_id):
+        return
     try:
-        meta = requests.get(f"{BASE_API_URL}/files/{file_id}", headers=HEADERS)
+        # Only files outside the listing get here (other courses, or a Files tab
+        # hidden from students), so their metadata has to be fetched
+        meta = SESSION.get(f"{BASE_API_URL}/files/{file_id}")
         meta.raise_for_status()
         file_data = meta.json()
-        download_url = file_data["url"]
         filename = make_safe(file_data["display_name"])
-
-        if download_url in downloaded_file_urls:
-            return
-
-        r = requests.get(download_url, headers=HEADERS)
-        r.raise_for_status()
-        save_or_unzip(r.content, course_folder, filename)
-
-        downloaded_file_urls.add(download_url)
-        print(f"    ✅ Downloaded file from API: {filename}")
+        if fetch_canvas_file(file_data, course_folder, filename):
+            print(f"    ✅ Downloaded file from API: {filename}")
+        else:
+            print(f"    ⏭️  Unchanged: {filename}")
     except Exception as e:
         print(f"    ❌ Error downloading file ID {file_id}: {e}")
 
 
 def extract_and_download_linked_files(html, course_folder):
     """Extract file IDs from HTML and download the associated files."""
-    soup = BeautifulSoup(html, "html.parser")
+    # File references show up in href/src attributes and in script text alike;
+    # one regex sweep over the raw HTML finds them all without building a DOM
+    for file_id in set(_FILE_ID_RE.findall(html or "")):
+        download_canvas_file_by_id(file_id, course_folder)
+
+
+def run_concurrently(fn, items):
+    """Run fn on every item using the shared download pool and wait for all of them."""
+    futures = [DOWNLOAD_POOL.submit(fn, item) for item in items]
+    for future in as_completed(futures):
+        future.result()
+
+
+def list_course_files(course_id):
+    """Fetch the course's Files listing and index it in course_files."""
+    files = safe_paginate(f"{BASE_API_URL}/courses/{course_id}/files?per_page=100")
+    course_files.update({str(file["id"]): file for file in files})
+    name_counts = Counter(make_safe(file["filename"]) for file in files)
+    shared_filenames.update(name for name, count in name_counts.items() if count > 1)
+    return files
+
+
+def download_course_files(course_id, course_folder, files=None):
+    """Download every file listed in the course's Files section."""
+    print("  Downloading files...")
+
+    def download_file(file):
+        try:
+            if not claim_file_id(file["id"]):
+                return
+            filename = make_safe(file["filename"])
+            if fetch_canvas_file(file, course_folder, filename):
+                print(f"    ✅ Downloaded file: {filename}")
+            else:
+                print(f"    ⏭️  Unchanged: {filename}")
+        except Exception as e:
+            print(f"    Error downloading {file.get('filename', 'unknown')}: {e}")
+
+    if files is None:
+        files = list_course_files(course_id)
+    run_concurrently(download_file, files)
+
+
+def download_course_pages(course_id, course_folder):
+    """Download linked files from each course page and save the page as PDF."""
+    print("  Downloading pages...")
+
+    def download_page(page):
+        try:
+            if "body" in page:
+                body = page["body"] or ""
+            else:
+                # Bodies normally come inline with the listing (include[]=body)
+                detail = SESSION.get(
+                    f"{BASE_API_URL}/courses/{course_id}/pages/{quote(page['url'], safe='')}"
+                )
+                if detail.status_code in [403, 404]:
+                    return
+                detail.raise_for_status()
+                body = detail.json().get("body", "")
+            name = f"page - {page['title']}"
+            extract_and_download_linked_files(body, course_folder)
+            save_html_as_pdf(course_folder, name, body)
+        except Exception as e:
+            print(f"    Error handling page {page['title']}: {e}")
+
+    run_concurrently(
+        download_page,
+        safe_paginate(
+            f"{BASE_API_URL}/courses/{course_id}/pages?per_page=100&include[]=body"
+        ),
+    )
 
-    for tag in soup.find_all(["a", "iframe"], href=True) + soup.find_all(
-        ["a", "iframe"], src=True
-    ):
-        href = tag.get("href") or tag.get("src")
-        if href:
-            match = re.search(r"/files/(\d+)", href)
-            if match:
-                file_id = match.group(1)
-                download_canvas_file_by_id(file_id, course_folder)
 
-    for script in soup.find_all("script"):
-        if script.string:
-            matches = re.findall(r"/files/(\d+)", script.string)
-            for file_id in set(matches):
-                download_canvas_file_by_id(file_id, course_folder)
+def download_course_assignments(course_id, course_folder):
+    """Download linked files from each assignment and save it as PDF."""
+    print("  Downloading assignments...")
+
+    def download_assignment(assignment):
+        try:
+            description_html = assignment.get("description") or ""
+            if not description_html.strip():
+                return
+            name = f"assignment - {assignment['name']}"
+            extract_and_download_linked_files(description_html, course_folder)
+            if is_blank_html(description_html):
+                print(f"    Skipped blank document: {make_safe(name)}")
+                return
+            html = f"<h1>{assignment['name']}</h1><p>{description_html}</p>"
+            save_html_as_pdf(course_folder, name, html, check_blank=False)
+        except Exception as e:
+            print(f"    Error handling assignment {assignment['name']}: {e}")
+
+    run_concurrently(
+        download_assignment,
+        safe_paginate(f"{BASE_API_URL}/courses/{course_id}/assignments?per_page=100"),
+    )
+
+
+def download_course_modules(course_id, course_folder):
+    """Download module items and save each module outline as Markdown."""
+    print("  Downloading modules...")
+
+    def download_module(module):
+        try:
+            name = f"module - {module['name']}"
+            # Items come inline with the module listing; Canvas leaves them out
+            # for very large modules, in which case they are paged separately
+            items = module.get("items")
+            if items is None:
+                items = safe_paginate(
+                    f"{BASE_API_URL}/courses/{course_id}/modules/{module['id']}/items?per_page=100&include[]=content_details"
+                )
+            # An empty module would only produce a heading
+            if not items:
+                print(f"    Skipped empty module: {make_safe(name)}")
+                return
+
+            # Start markdown content; lines are collected and joined once at the end
+            md_lines = [f"# {module['name']}\n\n"]
+
+            for item in items:
+                item_title = item.get("title", "Untitled")
+                item_type = item.get("type", "Unknown")
+
+                # Build markdown list item with link if available
+                # Prefer File-type items (download via API) to avoid relying on web pages that may require session auth
+                if item.get("type") == "File" and "content_id" in item:
+                    # For files, link to the URL from the inline content details
+                    # (falling back to the item's Canvas page) and download via API
+                    content_details = item.get("content_details") or {}
+                    file_url = content_details.get("url") or item.get("html_url")
+                    if file_url:
+                        md_lines.append(f"- [{item_title}]({file_url}) ({item_type})\n")
+                    else:
+                        md_lines.append(f"- {item_title} ({item_type})\n")
+
+                    download_canvas_file_by_id(item["content_id"], course_folder)
+                elif item.get("type") == "Page" and "page_url" in item:
+                    # Page slugs are usually URL-safe, but quote them so an odd
+                    # character can't turn the request into a 404
+                    page_url = quote(item["page_url"], safe="")
+                    page_api_url = (
+                        f"{BASE_API_URL}/courses/{course_id}/pages/{page_url}"
+                    )
+                    # Create a link to the page
+                    page_html_url = (
+                        f"{CANVAS_DOMAIN}/courses/{course_id}/pages/{page_url}"
+                    )
+                    md_lines.append(
+                        f"- [{item_title}]({page_html_url}) ({item_type})\n"
+                    )
+
+                    page_resp = SESSION.get(page_api_url)
+                    if page_resp.ok:
+                        body = page_resp.json().get("body", "")
+                        extract_and_download_linked_files(body, course_folder)
+                elif item.get("type") == "ExternalUrl":
+                    external_url = item.get("external_url") or item.get("html_url")
+                    md_lines.append(f"- [{item_title}]({external_url}) ({item_type})\n")
+
+                    # If the URL points to a Canvas file (e.g., /files/<id>), download it via the API
+                    m = _FILE_ID_RE.search(external_url or "")
+                    if m:
+                        download_canvas_file_by_id(m.group(1), course_folder)
+                elif "html_url" in item or "url" in item:
+                    # Assignments, quizzes, discussions, ...: their content is covered
+                    # by the other stages, so only link them (fetching the Canvas web
+                    # page would need session auth anyway)
+                    html_url = item.get("html_url") or item.get("url")
+                    md_lines.append(f"- [{item_title}]({html_url}) ({item_type})\n")
+                else:
+                    # No link available, just show title and type
+                    md_lines.append(f"- {item_title} ({item_type})\n")
+
+            save_markdown(course_folder, name, "".join(md_lines))
+        except Exception as e:
+            print(f"    Error saving module {module['name']}: {e}")
+
+    run_concurrently(
+        download_module,
+        safe_paginate(
+            f"{BASE_API_URL}/courses/{course_id}/modules?per_page=100&include[]=items&include[]=content_details"
+        ),
+    )
+
+
+def download_course_submissions(course_id, course_folder):
+    """Download attachments from the user's own submissions."""
+    print("  Downloading your submissions...")
+
+    def download_attachment(attachment):
+        try:
+            file_url = attachment["url"]
+            if not claim_download(file_url):
+                return
+            filename = make_safe(f"submission - {attachment['filename']}")
+            if fetch_canvas_file(attachment, course_folder, filename):
+                print(f"    ✅ Downloaded submission: {filename}")
+            else:
+                print(f"    ⏭️  Unchanged: {filename}")
+        except Exception as e:
+            print(f"    Error downloading submission file: {e}")
+
+    submissions = safe_paginate(
+        f"{BASE_API_URL}/courses/{course_id}/students/submissions?per_page=100"
+    )
+    run_concurrently(
+        download_attachment,
+        [
+            attachment
+            for sub in submissions
+            for attachment in sub.get("attachments", [])
+        ],
+    )
 
 
 def main():
@@ -337,6 +1130,8 @@ def main():
         )
         return
 
+    load_manifest()
+
     print("Fetching your Canvas courses...")
 
     # Only fetch currently enrolled (active) courses
@@ -358,158 +1153,34 @@ def main():
         course_folder = os.path.join(DOWNLOADS_BASE, course_name)
         os.makedirs(course_folder, exist_ok=True)
 
-        print("  Downloading files...")
-        for file in safe_paginate(
-            f"{BASE_API_URL}/courses/{course_id}/files?per_page=100"
-        ):
-            try:
-                file_url = file["url"]
-                if file_url in downloaded_file_urls:
-                    continue
-                r = requests.get(file_url, headers=HEADERS)
-                r.raise_for_status()
-                file_path = os.path.join(course_folder, make_safe(file["filename"]))
-                save_or_unzip(r.content, course_folder, make_safe(file["filename"]))
-                downloaded_file_urls.add(file_url)
-                print(f"    ✅ Downloaded file: {make_safe(file['filename'])}")
-            except Exception as e:
-                print(f"    Error downloading {file.get('filename', 'unknown')}: {e}")
-
-        print("  Downloading pages...")
-        for page in safe_paginate(
-            f"{BASE_API_URL}/courses/{course_id}/pages?per_page=100"
-        ):
-            try:
-                detail = requests.get(
-                    f"{BASE_API_URL}/courses/{course_id}/pages/{page['url']}",
-                    headers=HEADERS,
-                )
-                if detail.status_code in [403, 404]:
-                    continue
-                detail.raise_for_status()
-                body = detail.json().get("body", "")
-                name = f"page - {page['title']}"
-                extract_and_download_linked_files(body, course_folder)
-                save_html_as_pdf(course_folder, name, body)
-            except Exception as e:
-                print(f"    Error handling page {page['title']}: {e}")
-
-        print("  Downloading assignments...")
-        for assignment in safe_paginate(
-            f"{BASE_API_URL}/courses/{course_id}/assignments?per_page=100"
-        ):
-            try:
-                description_html = assignment.get("description", "")
-                name = f"assignment - {assignment['name']}"
-                extract_and_download_linked_files(description_html, course_folder)
-                html = f"<h1>{assignment['name']}</h1><p>{description_html}</p>"
-                save_html_as_pdf(course_folder, name, html)
-            except Exception as e:
-                print(f"    Error handling assignment {assignment['name']}: {e}")
-
-        print("  Downloading modules...")
-        for module in safe_paginate(
-            f"{BASE_API_URL}/courses/{course_id}/modules?per_page=100"
-        ):
-            try:
-                # Start markdown content
-                md_content = f"# {module['name']}\n\n"
-                items = safe_paginate(
-                    f"{BASE_API_URL}/courses/{course_id}/modules/{module['id']}/items?per_page=100"
-                )
-
-                for item in items:
-                    item_title = item.get("title", "Untitled")
-                    item_type = item.get("type", "Unknown")
-
-                    # Build markdown list item with link if available
-                    # Prefer File-type items (download via API) to avoid relying on web pages that may require session auth
-                    if item.get("type") == "File" and "content_id" in item:
-                        # For files, try to get the file URL and download via API
-                        try:
-                            file_meta = requests.get(
-                                f"{BASE_API_URL}/files/{item['content_id']}",
-                                headers=HEADERS,
-                            )
-                            if file_meta.ok:
-                                file_data = file_meta.json()
-                                file_url = file_data.get("url", "")
-                                if file_url:
-                                    md_content += (
-                                        f"- [{item_title}]({file_url}) ({item_type})\n"
-                                    )
-                                else:
-                                    md_content += f"- {item_title} ({item_type})\n"
-                        except Exception:
-                            md_content += f"- {item_title} ({item_type})\n"
-
-                        download_canvas_file_by_id(item["content_id"], course_folder)
-                    elif "html_url" in item or "url" in item:
-                        html_url = item.get("html_url") or item.get("url")
-                        md_content += f"- [{item_title}]({html_url}) ({item_type})\n"
-
-                        # If the URL itself points to a Canvas file (e.g., /files/<id>), download it directly via the API
-                        m = re.search(r"/files/(\d+)", html_url)
-                        if m:
-                            file_id = m.group(1)
-                            download_canvas_file_by_id(file_id, course_folder)
-                        else:
-                            # Otherwise fetch the page and parse for linked files (may be behind session auth)
-                            item_resp = requests.get(html_url, headers=HEADERS)
-                            if item_resp.ok:
-                                extract_and_download_linked_files(
-                                    item_resp.text, course_folder
-                                )
-                    elif item.get("type") == "Page" and "page_url" in item:
-                        page_url = item["page_url"]
-                        page_api_url = (
-                            f"{BASE_API_URL}/courses/{course_id}/pages/{page_url}"
-                        )
-                        # Create a link to the page
-                        page_html_url = (
-                            f"{CANVAS_DOMAIN}/courses/{course_id}/pages/{page_url}"
-                        )
-                        md_content += (
-                            f"- [{item_title}]({page_html_url}) ({item_type})\n"
-                        )
-
-                        page_resp = requests.get(page_api_url, headers=HEADERS)
-                        if page_resp.ok:
-                            body = page_resp.json().get("body", "")
-                            extract_and_download_linked_files(body, course_folder)
-                    else:
-                        # No link available, just show title and type
-                        md_content += f"- {item_title} ({item_type})\n"
-
-                name = f"module - {module['name']}"
-                save_markdown(course_folder, name, md_content)
-            except Exception as e:
-                print(f"    Error saving module {module['name']}: {e}")
-
-        if not DOWNLOAD_SUBMISSIONS:
+        # The file listing is shared: linked files (e.g. module File items) that
+        # appear in it are left to the files stage instead of costing a
+        # GET /files/<id> each
+        files = list_course_files(course_id)
+
+        # The stages are independent of each other, so fetch them concurrently; the
+        # shared SESSION connection pool is thread-safe.
+        stages = [
+            functools.partial(download_course_files, files=files),
+            download_course_pages,
+            download_course_assignments,
+            download_course_modules,
+        ]
+        if DOWNLOAD_SUBMISSIONS:
+            stages.append(download_course_submissions)
+        else:
             print(
                 "  ⚠️ Skipping downloading student submissions (DOWNLOAD_SUBMISSIONS=false)"
             )
-        else:
-            print("  Downloading your submissions...")
-            submissions = safe_paginate(
-                f"{BASE_API_URL}/courses/{course_id}/students/submissions?per_page=100"
-            )
-            for sub in submissions:
-                for attachment in sub.get("attachments", []):
-                    try:
-                        file_url = attachment["url"]
-                        if file_url in downloaded_file_urls:
-                            continue
-                        filename = make_safe(f"submission - {attachment['filename']}")
-                        r = requests.get(file_url, headers=HEADERS)
-                        r.raise_for_status()
-                        save_or_unzip(r.content, course_folder, filename)
-                        downloaded_file_urls.add(file_url)
-                        print(f"    ✅ Downloaded submission: {filename}")
-                    except Exception as e:
-                        print(f"    Error downloading submission file: {e}")
+        with ThreadPoolExecutor(max_workers=len(stages)) as pool:
+            futures = [pool.submit(stage, course_id, course_folder) for stage in stages]
+            for future in futures:
+                future.result()
 
+    print("\nRendering PDFs...")
+    render_pdfs()
+
+    save_manifest()
     print(f"\n✅ All course content downloaded to {DOWNLOADS_BASE}")
 
     # If running in GitHub Actions, commit and push
@@ -520,6 +1191,10 @@ def main():
     ):
         commit_and_push()
 
+    DOWNLOAD_POOL.shutdown()
+    PAGINATION_POOL.shutdown()
+    SESSION.close()
+
 
 def commit_and_push():
     """Commit and push downloaded files to git (GitHub Actions only)."""